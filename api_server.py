@@ -5,40 +5,62 @@ Provides REST API endpoints for video restoration using SeedVR models.
 """
 
 import os
-import sys
 import asyncio
+import mimetypes
 import tempfile
 import shutil
-from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Set, Tuple
 import uuid
 import logging
-from contextlib import asynccontextmanager
+from urllib.parse import quote
+from contextlib import AsyncExitStack, asynccontextmanager
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from starlette.datastructures import QueryParams
+from pydantic import BaseModel, Field, ValidationError
+import aiofiles
+import orjson
 import uvicorn
 
+from batch_dispatcher import BatchDispatcher
+from celery_worker import celery_app
+from result_cache import ResultCache, ResultKey
+from task_store import TaskStore
+from temp_gc import task_temp_prefix, temp_gc_loop
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global variables for model
-runner = None
-model_loaded = False
+# Size of each read when streaming uploads to disk (default 1 MiB)
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+
+# Size of each read when streaming downloads (default 256 KiB)
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', str(256 * 1024)))
+
+# Model size the workers are deployed with, part of the result cache key (default: 7b)
+MODEL_SIZE = os.getenv('MODEL_SIZE', '7b')
+
+# Directory for uploads, must be visible to the inference workers (default: system temp dir)
+UPLOAD_DIR = os.getenv('UPLOAD_DIR') or None
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
 
 class InferenceRequest(BaseModel):
     """Request model for inference parameters"""
-    cfg_scale: float = 1.0
+    cfg_scale: float = Field(1.0, ge=0.0, le=30.0)
     cfg_rescale: float = 0.0
-    sample_steps: int = 1
+    sample_steps: int = Field(1, ge=1, le=50)
     seed: int = 666
-    res_h: int = 720
-    res_w: int = 1280
-    sp_size: int = 1
-    model_size: str = "7b"  # "3b" or "7b"
+    res_h: int = Field(720, ge=16, le=2160)
+    res_w: int = Field(1280, ge=16, le=3840)
+    sp_size: int = Field(1, ge=1)
 
 class InferenceResponse(BaseModel):
     """Response model for inference results"""
@@ -48,65 +70,124 @@ class InferenceResponse(BaseModel):
     output_path: Optional[str] = None
     processing_time: Optional[float] = None
 
-# Store for tracking tasks
-tasks = {}
+# Store for tracking tasks, shared across worker processes
+task_store = TaskStore()
 
-def load_model(model_size: str = "7b"):
-    """Load the SeedVR model"""
-    global runner, model_loaded
-    
+# Cache of finished outputs, keyed by input video and parameters (opened on startup)
+result_cache: Optional[ResultCache] = None
+
+def send_batch(jobs, params):
+    """Queue a batch of jobs sharing the same parameters for an inference worker"""
+    celery_app.send_task("run_seedvr_batch", args=(jobs, params))
+
+# Groups compatible jobs into batches before they reach a worker
+batch_dispatcher = BatchDispatcher(send_batch)
+
+@asynccontextmanager
+async def redis_lifespan(app: FastAPI):
+    """Connect to the task store, refusing to start without it"""
     try:
-        logger.info(f"Loading SeedVR2-{model_size.upper()} model...")
-        
-        # Import required modules
-        sys.path.append('/app')
-        
-        if model_size == "7b":
-            from projects.inference_seedvr2_7b import configure_runner
-        elif model_size == "3b":
-            from projects.inference_seedvr2_3b import configure_runner
-        else:
-            raise ValueError(f"Unsupported model size: {model_size}")
-        
-        # Configure and load model
-        sp_size = int(os.getenv('SP_SIZE', '1'))
-        runner = configure_runner(sp_size)
-        model_loaded = True
-        
-        logger.info(f"SeedVR2-{model_size.upper()} model loaded successfully!")
-        return True
-        
+        await task_store.ping()
     except Exception as e:
-        logger.error(f"Failed to load model: {str(e)}")
-        model_loaded = False
-        return False
+        await task_store.close()
+        raise RuntimeError(f"Task store is unreachable: {str(e)}") from e
+    try:
+        yield
+    finally:
+        await task_store.close()
 
 @asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Application lifespan manager"""
-    # Startup
-    logger.info("Starting SeedVR API Server...")
-    
-    # Load model on startup
-    model_size = os.getenv('MODEL_SIZE', '7b')
-    success = load_model(model_size)
-    
-    if not success:
-        logger.error("Failed to load model on startup")
-    
+async def cache_lifespan(app: FastAPI):
+    """Open the result cache, refusing to start without it"""
+    global result_cache
+    try:
+        result_cache = await asyncio.to_thread(ResultCache)
+    except Exception as e:
+        raise RuntimeError(f"Result cache is unavailable: {str(e)}") from e
     yield
+
+@asynccontextmanager
+async def broker_lifespan(app: FastAPI):
+    """Connect to the Celery broker, refusing to start without it"""
+    def connect():
+        with celery_app.connection_for_write() as conn:
+            conn.ensure_connection(max_retries=3)
+
+    try:
+        await asyncio.to_thread(connect)
+    except Exception as e:
+        raise RuntimeError(f"Celery broker is unreachable: {str(e)}") from e
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(celery_app.close)
+
+async def live_task_ids() -> Set[str]:
+    """IDs of tasks whose uploads are still queued or being processed"""
+    tasks = await task_store.list()
+    return {task_id for task_id, task in tasks.items() if task["status"] in ("pending", "processing")}
+
+@asynccontextmanager
+async def background_lifespan(app: FastAPI):
+    """Run the batch dispatcher and temp directory GC for the lifetime of the app"""
+    tasks = [
+        asyncio.create_task(batch_dispatcher.run()),
+        asyncio.create_task(temp_gc_loop([UPLOAD_DIR or tempfile.gettempdir()], live_tasks=live_task_ids)),
+    ]
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan manager
     
-    # Shutdown
-    logger.info("Shutting down SeedVR API Server...")
+    Composes the lifespans above in dependency order: startup fails closed if any of them
+    raises, and shutdown unwinds them in reverse once in-flight requests have drained.
+    """
+    logger.info("Starting SeedVR API Server...")
+    async with AsyncExitStack() as stack:
+        for child in (redis_lifespan, cache_lifespan, broker_lifespan, background_lifespan):
+            await stack.enter_async_context(child(app))
+        yield
+        logger.info("Shutting down SeedVR API Server...")
+
+class InferenceParamsValidator:
+    """Reject invalid inference parameters before the multipart upload is read"""
+    # FastAPI parses the whole form body before resolving dependencies, so check the
+    # query parameters here to avoid receiving a large upload only to return 422.
+    # Plain ASGI so every other request (e.g. /download streams) passes through untouched
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/inference":
+            try:
+                InferenceRequest(**QueryParams(scope["query_string"]))
+            except ValidationError as e:
+                # Same shape as FastAPI's own 422 body for query parameters
+                errors = [{**error, "loc": ("query", *error["loc"])} for error in e.errors()]
+                response = ORJSONResponse(status_code=422, content={"detail": jsonable_encoder(errors)})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
 
 # Create FastAPI app
 app = FastAPI(
     title="SeedVR Inference API",
     description="Video restoration API using SeedVR diffusion models",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Validate inference parameters inside CORS, so rejections carry its headers
+app.add_middleware(InferenceParamsValidator)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -116,13 +197,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def count_workers() -> int:
+    """Count inference workers with a loaded model, from their heartbeat keys"""
+    try:
+        return await task_store.count_workers()
+    except Exception as e:
+        logger.error(f"Failed to count inference workers: {str(e)}")
+        return 0
+
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {
         "message": "SeedVR Inference API",
         "version": "1.0.0",
-        "model_loaded": model_loaded,
+        "model_loaded": await count_workers() > 0,
         "endpoints": {
             "health": "/health",
             "inference": "/inference",
@@ -134,28 +223,21 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    workers = await count_workers()
     return {
-        "status": "healthy" if model_loaded else "unhealthy",
-        "model_loaded": model_loaded
+        "status": "healthy" if workers else "unhealthy",
+        "model_loaded": workers > 0,
+        "workers": workers
     }
 
 @app.post("/inference", response_model=InferenceResponse)
 async def create_inference(
     background_tasks: BackgroundTasks,
-    video: UploadFile = File(...),
-    cfg_scale: float = 1.0,
-    cfg_rescale: float = 0.0,
-    sample_steps: int = 1,
-    seed: int = 666,
-    res_h: int = 720,
-    res_w: int = 1280,
-    sp_size: int = 1
+    request: InferenceRequest = Depends(),
+    video: UploadFile = File(...)
 ):
     """Create a new inference task"""
     
-    if not model_loaded:
-        raise HTTPException(status_code=503, detail="Model not loaded")
-    
     # Validate file type
     if not video.content_type.startswith('video/'):
         raise HTTPException(status_code=400, detail="File must be a video")
@@ -164,23 +246,12 @@ async def create_inference(
     task_id = str(uuid.uuid4())
     
     # Create task entry
-    tasks[task_id] = {
+    await task_store.create(task_id, {
         "status": "pending",
         "message": "Task created, processing will start shortly",
         "output_path": None,
         "processing_time": None
-    }
-    
-    # Create request object
-    request = InferenceRequest(
-        cfg_scale=cfg_scale,
-        cfg_rescale=cfg_rescale,
-        sample_steps=sample_steps,
-        seed=seed,
-        res_h=res_h,
-        res_w=res_w,
-        sp_size=sp_size
-    )
+    })
     
     # Add background task
     background_tasks.add_task(process_video, task_id, video, request)
@@ -191,98 +262,81 @@ async def create_inference(
         message="Task created successfully"
     )
 
+def link_or_copy(src: str, dst: str):
+    """Hard-link a cached output to a task's own path, copying across filesystems"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
 async def process_video(task_id: str, video: UploadFile, request: InferenceRequest):
-    """Process video in background"""
+    """Save the uploaded video and queue it for an inference worker"""
     import time
     start_time = time.time()
     
     try:
-        # Update task status
-        tasks[task_id]["status"] = "processing"
-        tasks[task_id]["message"] = "Processing video..."
-        
-        # Create temporary directories
-        temp_dir = tempfile.mkdtemp()
+        # Create temporary directory, shared with the inference workers
+        temp_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix=task_temp_prefix(task_id), dir=UPLOAD_DIR)
         input_dir = os.path.join(temp_dir, "input")
-        output_dir = os.path.join(temp_dir, "output")
-        os.makedirs(input_dir, exist_ok=True)
-        os.makedirs(output_dir, exist_ok=True)
+        await asyncio.to_thread(os.makedirs, input_dir, exist_ok=True)
         
-        # Save uploaded video
+        # Stream uploaded video to disk chunk by chunk, hashing it on the way
         input_path = os.path.join(input_dir, video.filename)
-        with open(input_path, "wb") as buffer:
-            content = await video.read()
-            buffer.write(content)
+        result_key = ResultKey()
+        async with aiofiles.open(input_path, "wb") as buffer:
+            while chunk := await video.read(UPLOAD_CHUNK_SIZE):
+                result_key.update(chunk)
+                await buffer.write(chunk)
         
-        logger.info(f"Processing video: {video.filename} for task {task_id}")
+        params = request.dict()
+        cache_key = result_key.finalize({**params, "model_size": MODEL_SIZE})
         
-        # Import and run inference
-        sys.path.append('/app')
+        # Serve identical video + parameters straight from the cache
+        cached_path = await asyncio.to_thread(result_cache.get, cache_key)
+        if cached_path is not None:
+            final_output_path = os.path.join(
+                "/app/results", f"{task_id}_{os.path.basename(cached_path).split('_', 1)[-1]}"
+            )
+            await asyncio.to_thread(link_or_copy, cached_path, final_output_path)
+            await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
+            
+            await task_store.update(
+                task_id,
+                status="completed",
+                message="Video processing completed successfully (cached result)",
+                output_path=final_output_path,
+                processing_time=time.time() - start_time
+            )
+            logger.info(f"Task {task_id} served from result cache")
+            return
         
-        if request.model_size == "7b":
-            from projects.inference_seedvr2_7b import generation_loop
-        else:
-            from projects.inference_seedvr2_3b import generation_loop
+        # Mark the task queued before handing it off, so this can never overwrite a worker's status
+        await task_store.update(task_id, message="Task queued for processing")
         
-        # Run inference
-        generation_loop(
-            runner=runner,
-            video_path=input_dir,
-            output_dir=output_dir,
-            batch_size=1,
-            cfg_scale=request.cfg_scale,
-            cfg_rescale=request.cfg_rescale,
-            sample_steps=request.sample_steps,
-            seed=request.seed,
-            res_h=request.res_h,
-            res_w=request.res_w,
-            sp_size=request.sp_size
+        # Hand off to an inference worker, which owns the temporary directory from here on
+        await batch_dispatcher.submit(
+            {"task_id": task_id, "input_path": input_path, "cache_key": cache_key}, params
         )
         
-        # Find output file
-        output_files = list(Path(output_dir).glob("*"))
-        if not output_files:
-            raise Exception("No output file generated")
-        
-        output_file = output_files[0]
-        
-        # Move output to results directory
-        results_dir = "/app/results"
-        os.makedirs(results_dir, exist_ok=True)
-        final_output_path = os.path.join(results_dir, f"{task_id}_{output_file.name}")
-        shutil.move(str(output_file), final_output_path)
-        
-        # Update task status
-        processing_time = time.time() - start_time
-        tasks[task_id].update({
-            "status": "completed",
-            "message": "Video processing completed successfully",
-            "output_path": final_output_path,
-            "processing_time": processing_time
-        })
-        
-        logger.info(f"Task {task_id} completed in {processing_time:.2f} seconds")
+        logger.info(f"Queued video: {video.filename} for task {task_id}")
         
     except Exception as e:
-        logger.error(f"Error processing task {task_id}: {str(e)}")
-        tasks[task_id].update({
-            "status": "failed",
-            "message": f"Processing failed: {str(e)}",
-            "processing_time": time.time() - start_time
-        })
-    
-    finally:
-        # Cleanup temporary directory
+        logger.error(f"Error queueing task {task_id}: {str(e)}")
+        await task_store.update(
+            task_id,
+            status="failed",
+            message=f"Processing failed: {str(e)}"
+        )
         if 'temp_dir' in locals():
-            shutil.rmtree(temp_dir, ignore_errors=True)
+            await asyncio.to_thread(shutil.rmtree, temp_dir, ignore_errors=True)
 
 @app.get("/status/{task_id}", response_model=InferenceResponse)
 async def get_task_status(task_id: str):
     """Get task status"""
-    if task_id not in tasks:
+    task = await task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = tasks[task_id]
     return InferenceResponse(
         task_id=task_id,
         status=task["status"],
@@ -291,45 +345,110 @@ async def get_task_status(task_id: str):
         processing_time=task["processing_time"]
     )
 
+async def send_bytes_range_requests(path: str, start: int, end: int, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+    """Stream bytes start..end (inclusive) of a file in chunks"""
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def get_range_header(range_header: str, file_size: int) -> Tuple[int, int]:
+    """Parse a single-range "bytes=start-end" header into inclusive offsets"""
+    def _invalid_range():
+        return HTTPException(
+            status_code=416,
+            detail=f"Invalid request range (Range: {range_header!r})",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    
+    try:
+        unit, _, byte_range = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in byte_range:
+            raise ValueError
+        first, _, last = byte_range.strip().partition("-")
+        if first:
+            start = int(first)
+            end = int(last) if last else file_size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(file_size - int(last), 0)
+            end = file_size - 1
+    except ValueError:
+        raise _invalid_range()
+    
+    end = min(end, file_size - 1)
+    if start < 0 or start > end:
+        raise _invalid_range()
+    return start, end
+
+def content_disposition(filename: str, disposition_type: str = "inline") -> str:
+    """Content-Disposition header value, quoted the same way as FileResponse"""
+    # Header values are latin-1, so non-ASCII or special names go in RFC 5987 form
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition_type}; filename*=utf-8''{quoted}"
+    return f'{disposition_type}; filename="{filename}"'
+
 @app.get("/download/{task_id}")
-async def download_result(task_id: str):
-    """Download processed video"""
-    if task_id not in tasks:
+async def download_result(task_id: str, request: Request):
+    """Download processed video, honouring HTTP Range requests"""
+    task = await task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = tasks[task_id]
-    
     if task["status"] != "completed":
         raise HTTPException(status_code=400, detail="Task not completed")
     
     if not task["output_path"] or not os.path.exists(task["output_path"]):
         raise HTTPException(status_code=404, detail="Output file not found")
     
-    return FileResponse(
-        path=task["output_path"],
-        filename=os.path.basename(task["output_path"]),
-        media_type='application/octet-stream'
+    path = task["output_path"]
+    file_size = os.path.getsize(path)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(os.path.basename(path))
+    }
+    
+    range_header = request.headers.get("range")
+    if range_header is None:
+        start, end, status_code = 0, file_size - 1, 200
+    else:
+        start, end = get_range_header(range_header, file_size)
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    return StreamingResponse(
+        send_bytes_range_requests(path, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
     )
 
 @app.get("/tasks")
 async def list_tasks():
     """List all tasks"""
-    return {"tasks": tasks}
+    return {"tasks": await task_store.list()}
 
 @app.delete("/tasks/{task_id}")
 async def delete_task(task_id: str):
     """Delete a task and its output file"""
-    if task_id not in tasks:
+    task = await task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = tasks[task_id]
-    
     # Remove output file if exists
     if task["output_path"] and os.path.exists(task["output_path"]):
-        os.remove(task["output_path"])
+        await asyncio.to_thread(os.remove, task["output_path"])
     
-    # Remove task from memory
-    del tasks[task_id]
+    # Remove task from the store
+    await task_store.delete(task_id)
     
     return {"message": "Task deleted successfully"}
 
@@ -339,12 +458,15 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
     workers = int(os.getenv("WORKERS", "1"))
     
-    logger.info(f"Starting SeedVR API server on {host}:{port}")
+    logger.info(f"Starting SeedVR API server on {host}:{port} with {workers} worker(s)")
     
     uvicorn.run(
         "api_server:app",
         host=host,
         port=port,
         workers=workers,
-        reload=False
+        loop="uvloop",
+        http="httptools",
+        reload=False,
+        log_config=None
     )
\ No newline at end of file
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+SeedVR Batch Dispatcher
+Micro-batches queued inference jobs so compatible requests share one forward pass.
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Largest batch sent to a worker, and how long to wait for one to fill up
+MAX_BATCH = int(os.getenv('MAX_BATCH', '1'))
+MAX_WAIT_MS = int(os.getenv('MAX_WAIT_MS', '50'))
+
+# A queued job: (job, params, future resolved once the job has been dispatched)
+QueuedJob = Tuple[Dict[str, Any], Dict[str, Any], asyncio.Future]
+
+
+class BatchDispatcher:
+    """Collect jobs for up to MAX_WAIT_MS and dispatch those with identical parameters together
+
+    generation_loop applies one set of parameters to a whole batch, so jobs are grouped by
+    their full parameter dict. ``send_batch(jobs, params)`` hands a group to the workers.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[Dict[str, Any]], Dict[str, Any]], None],
+        max_batch: int = MAX_BATCH,
+        max_wait_ms: int = MAX_WAIT_MS,
+    ):
+        self.send_batch = send_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def submit(self, job: Dict[str, Any], params: Dict[str, Any]) -> None:
+        """Queue a job and wait until it has been handed to a worker"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((job, params, future))
+        await future
+
+    async def run(self) -> None:
+        """Dispatch loop, run as a background task for the lifetime of the app"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+
+            # Keep collecting until the batch is full or the window closes
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[QueuedJob]) -> None:
+        groups: Dict[bytes, List[QueuedJob]] = {}
+        for item in batch:
+            key = orjson.dumps(item[1], option=orjson.OPT_SORT_KEYS)
+            groups.setdefault(key, []).append(item)
+
+        for group in groups.values():
+            jobs = [job for job, _, _ in group]
+            try:
+                # send_batch talks to the broker synchronously, keep it off the event loop
+                await asyncio.to_thread(self.send_batch, jobs, group[0][1])
+            except Exception as e:
+                logger.error(f"Failed to dispatch batch of {len(jobs)} job(s): {str(e)}")
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_result(None)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+SeedVR Inference Worker
+Celery worker that owns the SeedVR model and runs the inference jobs queued by the API server.
+
+Run one solo-pool worker per GPU, e.g.:
+    CUDA_VISIBLE_DEVICES=0 celery -A celery_worker worker --pool=solo --concurrency=1
+"""
+
+import os
+import sys
+import asyncio
+import shutil
+import tempfile
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from celery import Celery
+from celery.exceptions import WorkerShutdown
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+
+from result_cache import ResultCache
+from task_store import REDIS_URL, TaskStore, WorkerHeartbeat
+from temp_gc import TEMP_PREFIX, sweep_temp_dirs
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Broker used to hand jobs from the API server to workers
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+
+celery_app = Celery('seedvr', broker=CELERY_BROKER_URL)
+celery_app.conf.update(
+    task_ignore_result=True,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+# Global variables for model, loaded once per worker process
+runner = None
+model_loaded = False
+
+# Task store and the event loop used to drive it from synchronous tasks
+task_store = None
+_loop = None
+
+# Cache of finished outputs, shared with the API server
+result_cache = None
+
+# Liveness key the API server counts as a ready worker, published once the model is loaded
+heartbeat = None
+
+# Decoder/encoder for generation_loop, NVDEC/NVENC when enabled
+video_reader = None
+video_codec = 'h264'
+
+# Dedicated CUDA stream for inference, and the reusable output frame buffer
+inference_stream = None
+output_buffer = None
+
+def load_model(model_size: str = "7b"):
+    """Load the SeedVR model"""
+    global runner, model_loaded
+
+    # Never load a second copy of the model into the same process
+    if runner is not None:
+        logger.info("SeedVR model already loaded, skipping reload")
+        return True
+
+    try:
+        import torch
+
+        logger.info(f"Loading SeedVR2-{model_size.upper()} model...")
+        memory_before = torch.cuda.memory_allocated() / (1024 * 1024)
+
+        # Import required modules
+        sys.path.append('/app')
+
+        if model_size == "7b":
+            from projects.inference_seedvr2_7b import configure_runner, generation_loop
+        elif model_size == "3b":
+            from projects.inference_seedvr2_3b import configure_runner, generation_loop
+        else:
+            raise ValueError(f"Unsupported model size: {model_size}")
+
+        from runner_utils import TORCH_COMPILE, compile_runner, quantize_runner, warmup_runner
+
+        # Configure and load model
+        sp_size = int(os.getenv('SP_SIZE', '1'))
+        runner = quantize_runner(configure_runner(sp_size))
+        if TORCH_COMPILE:
+            compile_runner(runner)
+            warmup_runner(runner, generation_loop, sp_size=sp_size)
+        model_loaded = True
+
+        logger.info(f"SeedVR2-{model_size.upper()} model loaded successfully!")
+        logger.info(f"GPU memory allocated: {memory_before:.0f} MB before load, "
+                    f"{torch.cuda.memory_allocated() / (1024 * 1024):.0f} MB after")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to load model: {str(e)}")
+        model_loaded = False
+        return False
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Load the model and connect to the task store when a worker process starts"""
+    global task_store, _loop, result_cache, heartbeat, video_reader, video_codec, inference_stream, output_buffer
+
+    _loop = asyncio.new_event_loop()
+    task_store = TaskStore()
+    result_cache = ResultCache()
+
+    # Clear batch directories left behind by a previous crashed worker, sparing queued uploads
+    tasks = _loop.run_until_complete(task_store.list())
+    sweep_temp_dirs(keep={task_id for task_id, task in tasks.items() if task["status"] in ("pending", "processing")})
+
+    import torch
+    from runner_utils import OutputBuffer
+    from video_io import get_video_io
+    video_reader, video_codec = get_video_io()
+    inference_stream = torch.cuda.Stream() if torch.cuda.is_available() else None
+    output_buffer = OutputBuffer()
+
+    # Fail closed: a worker without a model would accept jobs it can only fail
+    model_size = os.getenv('MODEL_SIZE', '7b')
+    if not load_model(model_size):
+        raise WorkerShutdown("Failed to load model on worker startup")
+
+    heartbeat = WorkerHeartbeat()
+    heartbeat.start()
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    """Release the model's GPU memory and close the task store when a worker stops"""
+    global runner, model_loaded, task_store, heartbeat
+
+    if heartbeat is not None:
+        heartbeat.stop()
+        heartbeat = None
+
+    if runner is not None:
+        import gc
+        import torch
+
+        runner = None
+        model_loaded = False
+        gc.collect()
+        torch.cuda.empty_cache()
+        logger.info("Released SeedVR model")
+
+    if task_store is not None:
+        _loop.run_until_complete(task_store.close())
+        _loop.close()
+        task_store = None
+
+def _update_task(task_id: str, **fields: Any):
+    """Update a task entry from synchronous worker code"""
+    _loop.run_until_complete(task_store.update(task_id, **fields))
+
+@celery_app.task(name="run_seedvr")
+def run_seedvr(task_id: str, input_path: str, request: Dict[str, Any], cache_key: Optional[str] = None):
+    """Run inference on a single uploaded video"""
+    run_seedvr_batch([{"task_id": task_id, "input_path": input_path, "cache_key": cache_key}], request)
+
+@celery_app.task(name="run_seedvr_batch")
+def run_seedvr_batch(jobs: List[Dict[str, Any]], request: Dict[str, Any]):
+    """Run inference on uploaded videos sharing the same parameters in one batch
+
+    Each job is a dict with "task_id", "input_path" and optional "cache_key". Results and
+    failures are recorded per task in the task store.
+    """
+    start_time = time.time()
+    batch_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX)
+    pending = {job["task_id"]: job for job in jobs}
+
+    try:
+        if not model_loaded:
+            raise RuntimeError("Model not loaded")
+
+        # generation_loop reads every video in one directory, so link the uploads
+        # in under task-unique names and map outputs back by name
+        input_dir = os.path.join(batch_dir, "input")
+        output_dir = os.path.join(batch_dir, "output")
+        os.makedirs(input_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+
+        names = {}
+        for task_id, job in list(pending.items()):
+            if not os.path.exists(job["input_path"]):
+                # Report this instead of a missing output, e.g. when the upload was swept while queued
+                pending.pop(task_id)
+                logger.error(f"Input video for task {task_id} is missing: {job['input_path']}")
+                _update_task(
+                    task_id,
+                    status="failed",
+                    message="Processing failed: input video no longer exists",
+                    processing_time=time.time() - start_time
+                )
+                continue
+
+            name = f"{task_id}_{os.path.basename(job['input_path'])}"
+            os.symlink(job["input_path"], os.path.join(input_dir, name))
+            names[name] = task_id
+
+            # Update task status
+            _update_task(task_id, status="processing", message="Processing video...")
+
+        if not pending:
+            return
+
+        logger.info(f"Processing batch of {len(pending)} video(s): {', '.join(pending)}")
+
+        # Import and run inference
+        sys.path.append('/app')
+
+        if os.getenv('MODEL_SIZE', '7b') == "7b":
+            from projects.inference_seedvr2_7b import generation_loop
+        else:
+            from projects.inference_seedvr2_3b import generation_loop
+        from runner_utils import TORCH_COMPILE, inference_context
+
+        # Run inference without autograd bookkeeping, on the worker's own stream
+        with inference_context(inference_stream):
+            generation_loop(
+                runner=runner,
+                video_path=input_dir,
+                output_dir=output_dir,
+                batch_size=len(pending),
+                cfg_scale=request["cfg_scale"],
+                cfg_rescale=request["cfg_rescale"],
+                sample_steps=request["sample_steps"],
+                seed=request["seed"],
+                res_h=request["res_h"],
+                res_w=request["res_w"],
+                sp_size=request["sp_size"],
+                video_reader=video_reader,
+                video_codec=video_codec,
+                output_buffer=output_buffer,
+                dit_offload=not TORCH_COMPILE
+            )
+
+        # Move outputs to results directory
+        results_dir = "/app/results"
+        os.makedirs(results_dir, exist_ok=True)
+        processing_time = time.time() - start_time
+
+        for output_file in Path(output_dir).glob("*"):
+            task_id = names.get(output_file.name)
+            if task_id not in pending:
+                continue
+            job = pending.pop(task_id)
+
+            final_output_path = os.path.join(results_dir, output_file.name)
+            shutil.move(str(output_file), final_output_path)
+
+            if job.get("cache_key") is not None:
+                result_cache.put(job["cache_key"], final_output_path)
+
+            # Update task status
+            _update_task(
+                task_id,
+                status="completed",
+                message="Video processing completed successfully",
+                output_path=final_output_path,
+                processing_time=processing_time
+            )
+
+            logger.info(f"Task {task_id} completed in {processing_time:.2f} seconds")
+
+        if pending:
+            raise Exception("No output file generated")
+
+    except Exception as e:
+        for task_id in pending:
+            logger.error(f"Error processing task {task_id}: {str(e)}")
+            _update_task(
+                task_id,
+                status="failed",
+                message=f"Processing failed: {str(e)}",
+                processing_time=time.time() - start_time
+            )
+
+    finally:
+        # Cleanup the batch directory and each upload's temporary directory
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        for job in jobs:
+            # The API server saves uploads to <temp_dir>/input/<filename>
+            shutil.rmtree(os.path.dirname(os.path.dirname(job["input_path"])), ignore_errors=True)
@@ -75,7 +75,7 @@ def configure_runner(sp_size):
         runner.vae.set_memory_limit(**runner.config.vae.memory_limit)
     return runner
 
-def generation_step(runner, text_embeds_dict, cond_latents):
+def generation_step(runner, text_embeds_dict, cond_latents, dit_offload=True):
     def _move_to_cuda(x):
         return [i.to(get_device()) for i in x]
 
@@ -115,7 +115,7 @@ def generation_step(runner, text_embeds_dict, cond_latents):
         video_tensors = runner.inference(
             noises=noises,
             conditions=conditions,
-            dit_offload=True,
+            dit_offload=dit_offload,
             **text_embeds_dict,
         )
 
@@ -131,7 +131,9 @@ def generation_step(runner, text_embeds_dict, cond_latents):
 
     return samples
 
-def generation_loop(runner, video_path='./test_videos', output_dir='./results', batch_size=1, cfg_scale=1.0, cfg_rescale=0.0, sample_steps=1, seed=666, res_h=1280, res_w=720, sp_size=1):
+def generation_loop(runner, video_path='./test_videos', output_dir='./results', batch_size=1, cfg_scale=1.0,
+                    cfg_rescale=0.0, sample_steps=1, seed=666, res_h=1280, res_w=720, sp_size=1,
+                    video_reader=None, video_codec='h264', output_buffer=None, dit_offload=True):
 
     def _build_pos_and_neg_prompt():
         # read positive prompt
@@ -159,17 +161,22 @@ def generation_loop(runner, video_path='./test_videos', output_dir='./results',
     def _extract_text_embeds():
         # Text encoder forward.
         positive_prompts_embeds = []
-        for texts_pos in tqdm(original_videos_local):
+        for videos in tqdm(original_videos_local):
             text_pos_embeds = torch.load('pos_emb.pt')
             text_neg_embeds = torch.load('neg_emb.pt')
 
+            # one pos/neg embedding per video, runner.inference pairs them with the noises
             positive_prompts_embeds.append(
-                {"texts_pos": [text_pos_embeds], "texts_neg": [text_neg_embeds]}
+                {"texts_pos": [text_pos_embeds] * len(videos), "texts_neg": [text_neg_embeds] * len(videos)}
             )
         gc.collect()
         torch.cuda.empty_cache()
         return positive_prompts_embeds
 
+    def _read_video(path):
+        # Default CPU decode, returns TCHW frames in [0, 1]
+        return read_video(path, output_format="TCHW")[0] / 255.0
+
     def cut_videos(videos, sp_size):
         t = videos.size(1)
         if t <= 4 * sp_size:
@@ -189,6 +196,9 @@ def generation_loop(runner, video_path='./test_videos', output_dir='./results',
             assert (videos.size(1) - 1) % (4 * sp_size) == 0
             return videos
 
+    # video_reader may decode straight into GPU memory (e.g. NVDEC)
+    read_fn = video_reader or _read_video
+
     # classifier-free guidance
     runner.config.diffusion.cfg.scale = cfg_scale
     runner.config.diffusion.cfg.rescale = cfg_rescale
@@ -241,12 +251,7 @@ def generation_loop(runner, video_path='./test_videos', output_dir='./results',
         # read condition latents
         cond_latents = []
         for video in videos:
-            video = (
-                read_video(
-                   os.path.join(video_path, video), output_format="TCHW"
-                )[0]
-                / 255.0
-            )
+            video = read_fn(os.path.join(video_path, video))
             print(f"Read video size: {video.size()}")
             cond_latents.append(video_transform(video.to(get_device())))
 
@@ -254,20 +259,24 @@ def generation_loop(runner, video_path='./test_videos', output_dir='./results',
         input_videos = cond_latents
         cond_latents = [cut_videos(video, sp_size) for video in cond_latents]
 
-        runner.dit.to("cpu")
+        # dit_offload=False keeps the DiT resident, so a compiled DiT's CUDA graphs stay valid
+        if dit_offload:
+            runner.dit.to("cpu")
         print(f"Encoding videos: {list(map(lambda x: x.size(), cond_latents))}")
         runner.vae.to(get_device())
         cond_latents = runner.vae_encode(cond_latents)
         runner.vae.to("cpu")
-        runner.dit.to(get_device())
+        if dit_offload:
+            runner.dit.to(get_device())
 
         for i, emb in enumerate(text_embeds["texts_pos"]):
             text_embeds["texts_pos"][i] = emb.to(get_device())
         for i, emb in enumerate(text_embeds["texts_neg"]):
             text_embeds["texts_neg"][i] = emb.to(get_device())
 
-        samples = generation_step(runner, text_embeds, cond_latents=cond_latents)
-        runner.dit.to("cpu")
+        samples = generation_step(runner, text_embeds, cond_latents=cond_latents, dit_offload=dit_offload)
+        if dit_offload:
+            runner.dit.to("cpu")
         del cond_latents
 
         # dump samples to the output directory
@@ -296,13 +305,17 @@ def generation_loop(runner, video_path='./test_videos', output_dir='./results',
                     else rearrange(sample, "t c h w -> t h w c")
                 )
                 sample = sample.clip(-1, 1).mul_(0.5).add_(0.5).mul_(255).round()
-                sample = sample.to(torch.uint8).numpy()
+                if output_buffer is not None:
+                    # Reuse a persistent uint8 buffer instead of allocating per video
+                    sample = output_buffer(sample.shape).copy_(sample).numpy()
+                else:
+                    sample = sample.to(torch.uint8).numpy()
 
                 if sample.shape[0] == 1:
                     mediapy.write_image(filename, sample.squeeze(0))
                 else:
                     mediapy.write_video(
-                        filename, sample, fps=24
+                        filename, sample, fps=24, codec=video_codec
                     )
         gc.collect()
         torch.cuda.empty_cache()
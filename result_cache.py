@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+SeedVR Result Cache
+SQLite cache mapping a hash of (input video, inference parameters) to a finished output file.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+# Cache location and retention settings
+CACHE_DB = os.getenv('CACHE_DB', '/app/results/cache.db')
+CACHE_TTL = int(os.getenv('CACHE_TTL', str(24 * 60 * 60)))
+
+
+class ResultKey:
+    """Incremental content hash, fed with upload chunks as they are written to disk"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard everything hashed so far, e.g. when a download restarts from the beginning"""
+        self._hash = hashlib.blake2b(digest_size=32)
+
+    def update(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+
+    def finalize(self, params: Dict[str, Any]) -> str:
+        """Mix in the inference parameters and return the cache key"""
+        self._hash.update(orjson.dumps(params, option=orjson.OPT_SORT_KEYS))
+        return self._hash.hexdigest()
+
+
+class ResultCache:
+    """Cache of output paths for previously processed (video, parameters) pairs
+
+    With owns_outputs, the cache is the only reference to its output files, so evicting
+    an entry also deletes the file it points to.
+    """
+
+    def __init__(self, path: str = CACHE_DB, ttl: int = CACHE_TTL, owns_outputs: bool = False):
+        self.path = path
+        self.ttl = ttl
+        self.owns_outputs = owns_outputs
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, output_path TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # A fresh connection per call keeps the cache usable from any thread or process
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str) -> Optional[str]:
+        """Get the cached output path for a key, or None on a miss"""
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT output_path FROM cache WHERE key = ? AND created_at > ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                # Output was deleted since it was cached
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            return row[0]
+
+    def put(self, key: str, output_path: str) -> List[str]:
+        """Cache an output path and evict expired entries, returning the evicted output paths"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, output_path, created_at) VALUES (?, ?, ?)",
+                (key, output_path, now)
+            )
+            cutoff = now - self.ttl
+            expired = [
+                row[0] for row in
+                conn.execute("SELECT output_path FROM cache WHERE created_at <= ?", (cutoff,)).fetchall()
+            ]
+            conn.execute("DELETE FROM cache WHERE created_at <= ?", (cutoff,))
+
+        if self.owns_outputs:
+            for path in expired:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return expired
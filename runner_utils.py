@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+SeedVR Runner Utilities
+Load-time optimizations applied to a configured runner by the inference workers.
+"""
+
+import os
+import shutil
+import tempfile
+import logging
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Weight/activation quantization of the DiT: "fp8", "int8" or "none"
+QUANT = os.getenv('QUANT', 'none').lower()
+
+# Compile the DiT with CUDA graphs, warming up at a fixed resolution
+TORCH_COMPILE = os.getenv('TORCH_COMPILE', '0') == '1'
+WARMUP_RES_H = int(os.getenv('WARMUP_RES_H', '720'))
+WARMUP_RES_W = int(os.getenv('WARMUP_RES_W', '1280'))
+
+
+def quantize_runner(runner, mode: str = QUANT):
+    """Quantize the runner's DiT linears in place with torchao"""
+    if mode == 'none' or getattr(runner, '_quantized', None) is not None:
+        return runner
+    if mode not in ('fp8', 'int8'):
+        raise ValueError(f"Unsupported QUANT mode: {mode}")
+    if not torch.cuda.is_available():
+        logger.warning(f"QUANT={mode} requested without CUDA, skipping quantization")
+        return runner
+    if mode == 'fp8' and torch.cuda.get_device_capability() < (9, 0):
+        logger.warning("FP8 quantization needs compute capability 9.0+ (H100), skipping quantization")
+        return runner
+
+    # torchao is optional and needs a newer torch than the images pin
+    try:
+        from torchao.quantization import (
+            float8_dynamic_activation_float8_weight,
+            int8_dynamic_activation_int8_weight,
+            quantize_,
+        )
+    except ImportError as e:
+        logger.warning(f"QUANT={mode} requested but torchao is unavailable ({e}), skipping quantization")
+        return runner
+
+    config = (
+        float8_dynamic_activation_float8_weight()
+        if mode == 'fp8'
+        else int8_dynamic_activation_int8_weight()
+    )
+    quantize_(runner.dit, config)
+    runner._quantized = mode
+    logger.info(f"Quantized DiT to {mode.upper()}")
+    return runner
+
+
+@contextmanager
+def inference_context(stream: Optional["torch.cuda.Stream"] = None):
+    """Disable autograd tracking and optionally run on a dedicated CUDA stream"""
+    with torch.inference_mode(), torch.cuda.stream(stream):
+        yield
+
+
+class OutputBuffer:
+    """Persistent uint8 host buffer for decoded output frames, reused across requests
+
+    Frames are converted from CPU tensors, so the buffer is plain pageable memory.
+    Grows only when a request needs more frames than any before it.
+    """
+
+    def __init__(self):
+        self._storage = torch.empty(0, dtype=torch.uint8)
+
+    def __call__(self, shape: Sequence[int]) -> torch.Tensor:
+        """Get a uint8 view of the buffer with the given shape"""
+        numel = 1
+        for size in shape:
+            numel *= size
+        if numel > self._storage.numel():
+            self._storage = torch.empty(numel, dtype=torch.uint8)
+        return self._storage[:numel].view(*shape)
+
+
+def compile_runner(runner):
+    """Compile the runner's DiT so each step replays a captured CUDA graph
+
+    Only useful with generation_loop(dit_offload=False): moving the DiT between devices
+    reallocates its parameters and invalidates the captured graphs.
+
+    The DiT sees videos as flattened token sequences, so frame count and resolution become
+    one sequence length. With dynamic=None dynamo treats that length as dynamic after its
+    first change instead of recompiling for every new input size, but CUDA graphs are still
+    recorded once per distinct shape, so only the warmup shape is free on the first request.
+    """
+    if getattr(runner, '_compiled', False):
+        return runner
+
+    runner.dit = torch.compile(runner.dit, mode="reduce-overhead", fullgraph=False, dynamic=None)
+    runner._compiled = True
+    logger.info("Compiled DiT with torch.compile(mode='reduce-overhead')")
+    return runner
+
+
+def warmup_runner(runner, generation_loop, res_h: int = WARMUP_RES_H, res_w: int = WARMUP_RES_W, **kwargs):
+    """Run a throwaway generation so compilation happens before the first real request
+
+    Graphs are only recorded for the warmup shape; set WARMUP_RES_H/W to the usual request size.
+    """
+    import mediapy
+    import numpy as np
+
+    from temp_gc import TEMP_PREFIX
+
+    warmup_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX)
+    try:
+        input_dir = os.path.join(warmup_dir, "input")
+        os.makedirs(input_dir, exist_ok=True)
+        mediapy.write_video(
+            os.path.join(input_dir, "warmup.mp4"), np.zeros((5, res_h, res_w, 3), dtype=np.uint8), fps=24
+        )
+
+        logger.info(f"Warming up compiled model at {res_w}x{res_h}...")
+        with inference_context():
+            generation_loop(
+                runner=runner,
+                video_path=input_dir,
+                output_dir=os.path.join(warmup_dir, "output"),
+                res_h=res_h,
+                res_w=res_w,
+                dit_offload=False,
+                **kwargs
+            )
+        logger.info("Warmup complete")
+    finally:
+        shutil.rmtree(warmup_dir, ignore_errors=True)
@@ -1,68 +1,241 @@
 import runpod
 import os
 import sys
+import functools
+import threading
 import torch
+import shutil
 import tempfile
-import base64
 import json
+import uuid
 from pathlib import Path
 from typing import Dict, Any, Optional
 import logging
+from urllib.parse import urlparse
+
+import boto3
+import httpx
+
+# SIMD-accelerated base64 with the same API as the stdlib module
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 # Add project root to Python path
 sys.path.append('/app')
 
 # Import SeedVR modules
-from common.config import Config
 from common.logger import get_logger
-from projects.inference_seedvr2_7b import configure_runner, generation_step
-from projects.inference_seedvr2_3b import configure_runner as configure_runner_3b, generation_step as generation_step_3b
+from result_cache import CACHE_DB, ResultCache, ResultKey
+from temp_gc import TEMP_PREFIX, sweep_temp_dirs
+from runner_utils import TORCH_COMPILE, OutputBuffer, compile_runner, inference_context, quantize_runner, warmup_runner
+from video_io import get_video_io
+from projects.inference_seedvr2_7b import configure_runner, generation_loop
+from projects.inference_seedvr2_3b import configure_runner as configure_runner_3b, generation_loop as generation_loop_3b
+
+# Cache runner construction so each model is loaded at most once per process
+configure_runner = functools.cache(configure_runner)
+configure_runner_3b = functools.cache(configure_runner_3b)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = get_logger(__name__)
 
+# Number of base64 characters decoded per slice (must be a multiple of 4)
+DECODE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Object storage used for URL-based video transport (set S3_ENDPOINT_URL for R2/MinIO)
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
+PRESIGNED_URL_EXPIRY = int(os.getenv('PRESIGNED_URL_EXPIRY', '3600'))
+
+# Persistent directory for cached outputs, next to the cache database rather than under a GC'd temp dir
+RESULTS_DIR = os.getenv('RESULTS_DIR') or os.path.dirname(CACHE_DB) or '.'
+
+# Streaming download of 'video_url' inputs: read size, size limit (0 = unlimited) and resume attempts
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_INPUT_BYTES = int(os.getenv('MAX_INPUT_BYTES', '0'))
+DOWNLOAD_RETRIES = int(os.getenv('DOWNLOAD_RETRIES', '3'))
+
+def _gpu_memory_allocated_mb() -> float:
+    """GPU memory currently allocated by this process, in MB"""
+    if not torch.cuda.is_available():
+        return 0.0
+    return torch.cuda.memory_allocated() / (1024 * 1024)
+
+class _HashingWriter:
+    """Write-only file wrapper that feeds everything written through it to a ResultKey"""
+    
+    def __init__(self, f, result_key: ResultKey):
+        self._f = f
+        self._result_key = result_key
+    
+    def write(self, data: bytes) -> int:
+        self._result_key.update(data)
+        return self._f.write(data)
+
 class SeedVRWorker:
+    _instance = None
+    _lock = threading.Lock()
+    
     def __init__(self):
         self.model_size = os.getenv('MODEL_SIZE', '7b').lower()
         self.sp_size = int(os.getenv('SP_SIZE', '1'))
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.runner = None
-        self.config = None
+        # Cached outputs live only in RESULTS_DIR, so eviction deletes them
+        self.result_cache = ResultCache(owns_outputs=True)
+        self._s3 = None
+        self.video_reader, self.video_codec = get_video_io()
+        self._stream = torch.cuda.Stream() if torch.cuda.is_available() else None
+        self._output_buffer = OutputBuffer()
         self._initialize_model()
     
+    @classmethod
+    def get_instance(cls) -> 'SeedVRWorker':
+        """Get the process-wide worker, creating it on first use"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
     def _initialize_model(self):
         """Initialize the SeedVR model based on model size"""
         try:
+            memory_before = _gpu_memory_allocated_mb()
+            
             if self.model_size == '3b':
-                config_path = '/app/configs_3b/main.yaml'
-                self.config = Config.from_file(config_path)
-                self.runner = configure_runner_3b(self.config, self.sp_size)
-                self.generation_func = generation_step_3b
+                self.runner = quantize_runner(configure_runner_3b(self.sp_size))
+                self.generation_func = generation_loop_3b
                 logger.info("Initialized SeedVR2-3B model")
             else:
-                config_path = '/app/configs_7b/main.yaml'
-                self.config = Config.from_file(config_path)
-                self.runner = configure_runner(self.config, self.sp_size)
-                self.generation_func = generation_step
+                self.runner = quantize_runner(configure_runner(self.sp_size))
+                self.generation_func = generation_loop
                 logger.info("Initialized SeedVR2-7B model")
+            
+            if TORCH_COMPILE:
+                compile_runner(self.runner)
+                warmup_runner(self.runner, self.generation_func, sp_size=self.sp_size)
+            
+            logger.info(
+                f"GPU memory allocated: {memory_before:.0f} MB before load, "
+                f"{_gpu_memory_allocated_mb():.0f} MB after"
+            )
                 
         except Exception as e:
             logger.error(f"Failed to initialize model: {str(e)}")
             raise
     
-    def _decode_video_data(self, video_data: str) -> str:
-        """Decode base64 video data and save to temporary file"""
+    @property
+    def s3(self):
+        """S3 client, created on first use"""
+        if self._s3 is None:
+            self._s3 = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
+        return self._s3
+    
+    def _download_input(self, input_url: str, input_dir: str, result_key: Optional[ResultKey] = None) -> str:
+        """Stream an s3://bucket/key object into the job's input directory"""
+        try:
+            parsed = urlparse(input_url)
+            if parsed.scheme != 's3' or not parsed.netloc or not parsed.path.lstrip('/'):
+                raise ValueError(f"'input_url' must look like s3://bucket/key, got {input_url!r}")
+            bucket, key = parsed.netloc, parsed.path.lstrip('/')
+            
+            input_path = os.path.join(input_dir, 'input.mp4')
+            with open(input_path, 'wb') as f:
+                # A non-seekable writer makes boto3 deliver parts in order, so they can be hashed
+                self.s3.download_fileobj(bucket, key, f if result_key is None else _HashingWriter(f, result_key))
+            
+            return input_path
+        except Exception as e:
+            logger.error(f"Failed to download input video: {str(e)}")
+            raise
+    
+    def _download_url(self, video_url: str, input_dir: str, result_key: Optional[ResultKey] = None) -> str:
+        """Stream an http(s) video into the job's input directory, resuming with Range on failure"""
         try:
-            # Decode base64 data
-            video_bytes = base64.b64decode(video_data)
+            input_path = os.path.join(input_dir, 'input.mp4')
+            received = 0
+            
+            with httpx.Client(timeout=httpx.Timeout(30.0, read=None), follow_redirects=True) as client, \
+                    open(input_path, 'wb') as f:
+                for attempt in range(DOWNLOAD_RETRIES + 1):
+                    headers = {'Range': f'bytes={received}-'} if received else {}
+                    try:
+                        with client.stream('GET', video_url, headers=headers) as response:
+                            response.raise_for_status()
+                            if received and response.status_code != 206:
+                                # Server ignored the Range header, start over
+                                f.seek(0)
+                                f.truncate()
+                                received = 0
+                                if result_key is not None:
+                                    result_key.reset()
+                            
+                            # Reject oversized inputs before downloading them
+                            length = response.headers.get('Content-Length')
+                            if length is not None:
+                                logger.info(f"Downloading {int(length)} bytes from {video_url}")
+                                if MAX_INPUT_BYTES and received + int(length) > MAX_INPUT_BYTES:
+                                    raise ValueError(f"Input video exceeds MAX_INPUT_BYTES ({MAX_INPUT_BYTES} bytes)")
+                            
+                            for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                                received += len(chunk)
+                                if MAX_INPUT_BYTES and received > MAX_INPUT_BYTES:
+                                    raise ValueError(f"Input video exceeds MAX_INPUT_BYTES ({MAX_INPUT_BYTES} bytes)")
+                                if result_key is not None:
+                                    result_key.update(chunk)
+                                f.write(chunk)
+                        break
+                    except httpx.TransportError as e:
+                        if attempt == DOWNLOAD_RETRIES:
+                            raise
+                        logger.warning(f"Download interrupted after {received} bytes ({str(e)}), resuming")
             
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-            temp_file.write(video_bytes)
-            temp_file.close()
+            return input_path
+        except Exception as e:
+            logger.error(f"Failed to download video from URL: {str(e)}")
+            raise
+    
+    def _upload_result(self, video_path: str, bucket: str, prefix: str = '') -> str:
+        """Stream a result file to object storage and return a presigned download URL"""
+        try:
+            key = f"{prefix}{uuid.uuid4()}/{os.path.basename(video_path)}"
+            with open(video_path, 'rb') as f:
+                self.s3.upload_fileobj(f, bucket, key)
+            
+            return self.s3.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': bucket, 'Key': key},
+                ExpiresIn=PRESIGNED_URL_EXPIRY
+            )
+        except Exception as e:
+            logger.error(f"Failed to upload video result: {str(e)}")
+            raise
+    
+    def _decode_video_data(self, video_data: str, input_dir: str, result_key: Optional[ResultKey] = None) -> str:
+        """Decode base64 video data and save it into the job's input directory"""
+        try:
+            # Decode base64 data slice by slice so the whole video is never held twice
+            input_path = os.path.join(input_dir, 'input.mp4')
+            with open(input_path, 'wb') as f:
+                pending = ''
+                for start in range(0, len(video_data), DECODE_CHUNK_SIZE):
+                    # Drop line breaks and other whitespace, and carry characters past the last
+                    # full 4-character group into the next slice so every group decodes whole
+                    pending += ''.join(video_data[start:start + DECODE_CHUNK_SIZE].split())
+                    last = start + DECODE_CHUNK_SIZE >= len(video_data)
+                    size = len(pending) if last else len(pending) - len(pending) % 4
+                    if not size:
+                        continue
+                    chunk = base64.b64decode(pending[:size])
+                    pending = pending[size:]
+                    if result_key is not None:
+                        result_key.update(chunk)
+                    f.write(chunk)
             
-            return temp_file.name
+            return input_path
         except Exception as e:
             logger.error(f"Failed to decode video data: {str(e)}")
             raise
@@ -79,10 +252,14 @@ class SeedVRWorker:
     
     def process_video(self, job_input: Dict[str, Any]) -> Dict[str, Any]:
         """Process video using SeedVR model"""
+        job_dir = None
         try:
             # Extract parameters from job input
+            input_url = job_input.get('input_url')
             video_data = job_input.get('video_data')
             video_url = job_input.get('video_url')
+            output_bucket = job_input.get('output_bucket')
+            output_prefix = job_input.get('output_prefix', '')
             cfg_scale = float(job_input.get('cfg_scale', 1.0))
             cfg_rescale = float(job_input.get('cfg_rescale', 0.0))
             sample_steps = int(job_input.get('sample_steps', 1))
@@ -91,45 +268,90 @@ class SeedVRWorker:
             res_w = int(job_input.get('res_w', 1280))
             
             # Validate input
-            if not video_data and not video_url:
-                raise ValueError("Either 'video_data' (base64) or 'video_url' must be provided")
+            if not input_url and not video_data and not video_url:
+                raise ValueError("One of 'input_url' (s3://), 'video_data' (base64) or 'video_url' must be provided")
+            
+            # generation_loop processes every video in a directory, so each job gets its own
+            job_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX)
+            input_dir = os.path.join(job_dir, 'input')
+            output_dir = os.path.join(job_dir, 'output')
+            os.makedirs(input_dir, exist_ok=True)
             
             # Handle video input
-            if video_data:
-                input_video_path = self._decode_video_data(video_data)
+            # Every input is hashed as it is written, keying the result cache
+            result_key = ResultKey()
+            if input_url:
+                input_video_path = self._download_input(input_url, input_dir, result_key)
+            elif video_data:
+                logger.warning("Base64 'video_data' input is deprecated, pass an s3:// 'input_url' instead")
+                input_video_path = self._decode_video_data(video_data, input_dir, result_key)
             else:
-                # For video_url, you might want to download it first
-                # This is a simplified implementation
-                input_video_path = video_url
-            
-            # Create output directory
-            output_dir = tempfile.mkdtemp()
-            
-            # Run inference
-            logger.info(f"Starting video processing with parameters: cfg_scale={cfg_scale}, steps={sample_steps}, seed={seed}")
-            
-            result_path = self.generation_func(
-                runner=self.runner,
-                video_path=input_video_path,
-                output_dir=output_dir,
-                cfg_scale=cfg_scale,
-                cfg_rescale=cfg_rescale,
-                sample_steps=sample_steps,
-                seed=seed,
-                res_h=res_h,
-                res_w=res_w
-            )
+                input_video_path = self._download_url(video_url, input_dir, result_key)
+            cache_key = result_key.finalize({
+                "cfg_scale": cfg_scale,
+                "cfg_rescale": cfg_rescale,
+                "sample_steps": sample_steps,
+                "seed": seed,
+                "res_h": res_h,
+                "res_w": res_w,
+                "model_size": self.model_size
+            })
             
-            # Encode result video
-            result_video_base64 = self._encode_video_result(result_path)
+            # Reuse the output of an identical earlier job if we still have it
+            result_path = self.result_cache.get(cache_key)
+            if result_path is not None:
+                logger.info(f"Serving cached result for key {cache_key}")
+            else:
+                # Run inference
+                logger.info(
+                    "Starting video processing with parameters: "
+                    f"cfg_scale={cfg_scale}, steps={sample_steps}, seed={seed}"
+                )
+                
+                with inference_context(self._stream):
+                    self.generation_func(
+                        runner=self.runner,
+                        video_path=os.path.dirname(input_video_path),
+                        output_dir=output_dir,
+                        batch_size=1,
+                        cfg_scale=cfg_scale,
+                        cfg_rescale=cfg_rescale,
+                        sample_steps=sample_steps,
+                        seed=seed,
+                        res_h=res_h,
+                        res_w=res_w,
+                        sp_size=self.sp_size,
+                        video_reader=self.video_reader,
+                        video_codec=self.video_codec,
+                        output_buffer=self._output_buffer,
+                        dit_offload=not TORCH_COMPILE
+                    )
+                
+                output_files = list(Path(output_dir).glob("*"))
+                if not output_files:
+                    raise Exception("No output file generated")
+                result_path = str(output_files[0])
+                
+                # Keep the output outside the job directory so it survives cleanup
+                os.makedirs(RESULTS_DIR, exist_ok=True)
+                cached_path = os.path.join(RESULTS_DIR, cache_key + Path(result_path).suffix)
+                shutil.move(result_path, cached_path)
+                result_path = cached_path
+                self.result_cache.put(cache_key, result_path)
             
-            # Cleanup temporary files
-            if video_data:  # Only cleanup if we created the temp file
-                os.unlink(input_video_path)
+            # Upload result video, or fall back to inlining it as base64
+            if output_bucket:
+                result = {"result_url": self._upload_result(result_path, output_bucket, output_prefix)}
+            else:
+                logger.warning(
+                    "Returning base64 'result_video' is deprecated, pass 'output_bucket' to get a 'result_url'"
+                )
+                result = {"result_video": self._encode_video_result(result_path)}
             
             return {
                 "status": "success",
-                "result_video": result_video_base64,
+                **result,
+                # Cached output, kept on the worker until CACHE_TTL evicts it
                 "result_path": result_path,
                 "parameters": {
                     "cfg_scale": cfg_scale,
@@ -148,6 +370,9 @@ class SeedVRWorker:
                 "error": str(e),
                 "error_type": type(e).__name__
             }
+        finally:
+            if job_dir is not None:
+                shutil.rmtree(job_dir, ignore_errors=True)
 
 # Global worker instance
 worker = None
@@ -157,7 +382,7 @@ def initialize_worker():
     global worker
     if worker is None:
         logger.info("Initializing SeedVR worker...")
-        worker = SeedVRWorker()
+        worker = SeedVRWorker.get_instance()
         logger.info("SeedVR worker initialized successfully")
     return worker
 
@@ -175,6 +400,9 @@ def handler(job):
         # Initialize worker if not already done
         current_worker = initialize_worker()
         
+        # A warm worker runs many jobs, so clear directories orphaned by killed jobs before each one
+        sweep_temp_dirs()
+        
         # Extract job input
         job_input = job.get('input', {})
         
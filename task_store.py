@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+SeedVR Task Store
+Redis-backed task metadata shared by every API server worker process.
+"""
+
+import os
+import socket
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import orjson
+import redis as redis_sync
+import redis.asyncio as redis
+from redis.exceptions import WatchError
+
+logger = logging.getLogger(__name__)
+
+# Redis connection and retention settings
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+TASK_TTL = int(os.getenv('TASK_TTL', str(24 * 60 * 60)))
+TASK_KEY_PREFIX = 'seedvr:task:'
+
+# Inference worker liveness keys, refreshed well within their TTL while a worker is up
+WORKER_KEY_PREFIX = 'seedvr:worker:'
+WORKER_HEARTBEAT_TTL = int(os.getenv('WORKER_HEARTBEAT_TTL', '30'))
+
+
+class TaskStore:
+    """Store for tracking inference tasks, keyed by task ID"""
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = TASK_TTL, prefix: str = TASK_KEY_PREFIX):
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.prefix}{task_id}"
+
+    async def create(self, task_id: str, task: Dict[str, Any]) -> None:
+        """Create a task entry, expiring after the configured TTL"""
+        await self.redis.set(self._key(task_id), orjson.dumps(task), ex=self.ttl)
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a task entry, or None if it does not exist"""
+        raw = await self.redis.get(self._key(task_id))
+        return orjson.loads(raw) if raw is not None else None
+
+    async def update(self, task_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+        """Merge fields into a task entry and refresh its TTL"""
+        key = self._key(task_id)
+        async with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        return None
+                    task = orjson.loads(raw)
+                    task.update(fields)
+                    pipe.multi()
+                    pipe.set(key, orjson.dumps(task), ex=self.ttl)
+                    await pipe.execute()
+                    return task
+                except WatchError:
+                    # Another worker modified the task, retry with fresh data
+                    continue
+
+    async def delete(self, task_id: str) -> bool:
+        """Delete a task entry, returning whether it existed"""
+        return await self.redis.delete(self._key(task_id)) > 0
+
+    async def list(self) -> Dict[str, Dict[str, Any]]:
+        """List all tasks, using SCAN so large stores do not block Redis"""
+        keys = [key async for key in self.redis.scan_iter(match=f"{self.prefix}*", count=500)]
+        if not keys:
+            return {}
+
+        tasks = {}
+        for key, raw in zip(keys, await self.redis.mget(keys)):
+            # Keys may expire between SCAN and MGET
+            if raw is not None:
+                tasks[key.decode()[len(self.prefix):]] = orjson.loads(raw)
+        return tasks
+
+    async def count_workers(self, prefix: str = WORKER_KEY_PREFIX) -> int:
+        """Count inference workers with a live heartbeat key"""
+        return len([key async for key in self.redis.scan_iter(match=f"{prefix}*", count=500)])
+
+    async def ping(self) -> bool:
+        """Check that Redis is reachable"""
+        return await self.redis.ping()
+
+    async def close(self) -> None:
+        """Close the Redis connection pool"""
+        await self.redis.aclose()
+
+
+class WorkerHeartbeat:
+    """Keep a TTL'd liveness key for this worker process fresh from a background thread
+
+    Solo-pool workers cannot answer Celery broadcast pings while a task runs, so the API
+    counts these keys instead. A worker that dies stops refreshing and expires after the TTL.
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = WORKER_HEARTBEAT_TTL, prefix: str = WORKER_KEY_PREFIX):
+        self.redis = redis_sync.Redis.from_url(url)
+        self.ttl = ttl
+        self.key = f"{prefix}{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._thread = None
+
+    def beat(self) -> None:
+        """Refresh the liveness key"""
+        self.redis.set(self.key, b'1', ex=self.ttl)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                self.beat()
+            except Exception as e:
+                logger.error(f"Worker heartbeat failed: {str(e)}")
+
+    def start(self) -> None:
+        """Publish the key and keep refreshing it until stopped"""
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name='seedvr-heartbeat', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop refreshing and remove the key so the worker stops counting immediately"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.redis.delete(self.key)
+        finally:
+            self.redis.close()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+SeedVR Temp GC
+Removes temporary job directories orphaned by crashed or killed workers.
+"""
+
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Collection, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Prefix for every temporary directory this app creates, so GC never touches anything else
+TEMP_PREFIX = 'seedvr_'
+
+# Directories older than this are considered orphaned, unless their task is still live
+TMP_GC_MAX_AGE = int(os.getenv('TMP_GC_MAX_AGE', str(2 * 60 * 60)))
+TMP_GC_INTERVAL = int(os.getenv('TMP_GC_INTERVAL', str(5 * 60)))
+
+
+def task_temp_prefix(task_id: str) -> str:
+    """Prefix for a task's temporary directory, so sweeps can tell whose it is"""
+    return f"{TEMP_PREFIX}{task_id}_"
+
+
+def sweep_temp_dirs(roots: Optional[List[str]] = None, max_age: int = TMP_GC_MAX_AGE,
+                    keep: Collection[str] = ()) -> int:
+    """Delete stale TEMP_PREFIX directories under roots in parallel, returning how many were removed
+
+    Directories created with task_temp_prefix() for a task ID in keep are never removed,
+    however old, e.g. uploads still waiting in the queue.
+    """
+    cutoff = time.time() - max_age
+    stale = []
+    for root in roots or [tempfile.gettempdir()]:
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if (entry.name.startswith(TEMP_PREFIX) and entry.is_dir(follow_symlinks=False)
+                            and entry.stat(follow_symlinks=False).st_mtime < cutoff
+                            and entry.name[len(TEMP_PREFIX):].split('_', 1)[0] not in keep):
+                        stale.append(entry.path)
+        except FileNotFoundError:
+            continue
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda path: shutil.rmtree(path, ignore_errors=True), stale))
+        logger.info(f"Removed {len(stale)} orphaned temporary director{'y' if len(stale) == 1 else 'ies'}")
+    return len(stale)
+
+
+async def temp_gc_loop(roots: Optional[List[str]] = None, interval: int = TMP_GC_INTERVAL,
+                       live_tasks: Optional[Callable[[], Awaitable[Collection[str]]]] = None):
+    """Sweep stale temporary directories every interval seconds, sparing those of live_tasks()"""
+    while True:
+        try:
+            keep = await live_tasks() if live_tasks is not None else ()
+            await asyncio.to_thread(sweep_temp_dirs, roots, keep=keep)
+        except Exception as e:
+            logger.error(f"Temporary directory sweep failed: {str(e)}")
+        await asyncio.sleep(interval)
@@ -7,73 +7,314 @@ This script tests the RunPod worker both locally and remotely.
 
 import os
 import sys
-import json
-import base64
+import importlib.util
+import io
+import mmap
 import argparse
+import random
 import tempfile
+import time
+import threading
+import uuid
+from dataclasses import dataclass, fields
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, List, Optional, Union
 
+import orjson
+
+# SIMD-accelerated base64 with the same API as the stdlib module
 try:
-    import runpod
+    import pybase64 as base64
 except ImportError:
-    print("RunPod SDK not installed. Installing...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "runpod"])
+    import base64
+
+# Without pybase64, fall back to a Numba-compiled encoder when Numba is available
+_HAVE_NUMBA = False
+if base64.__name__ == 'base64':
+    try:
+        import numpy as np
+        from numba import njit, prange
+        _HAVE_NUMBA = True
+    except ImportError:
+        pass
+
+if _HAVE_NUMBA:
+    _B64_ALPHABET = np.frombuffer(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/', dtype=np.uint8)
+    
+    @njit(cache=True, parallel=True, boundscheck=False)
+    def _b64encode_numba(src, dst, alphabet):
+        # Each 3-byte group maps to 4 output characters independently, so groups run in parallel
+        for i in prange(src.size // 3):
+            a = src[3 * i]
+            b = src[3 * i + 1]
+            c = src[3 * i + 2]
+            dst[4 * i] = alphabet[a >> 2]
+            dst[4 * i + 1] = alphabet[((a & 3) << 4) | (b >> 4)]
+            dst[4 * i + 2] = alphabet[((b & 15) << 2) | (c >> 6)]
+            dst[4 * i + 3] = alphabet[c & 63]
+    
+    def _b64encode(data) -> bytes:
+        """Base64-encode a bytes-like object with the Numba kernel, padding the tail in Python"""
+        src = np.frombuffer(data, dtype=np.uint8)
+        groups = src.size // 3
+        dst = np.empty(((src.size + 2) // 3) * 4, dtype=np.uint8)
+        _b64encode_numba(src, dst, _B64_ALPHABET)
+        if src.size > groups * 3:
+            dst[groups * 4:] = np.frombuffer(base64.b64encode(src[groups * 3:].tobytes()), dtype=np.uint8)
+        return dst.tobytes()
+    
+    # Compile (or load from the on-disk cache) now rather than on the first real video
+    _b64encode(b'warmup')
+else:
+    _b64encode = base64.b64encode
+
+# Installing on import is opt-in, so a missing SDK fails fast in main() instead
+try:
     import runpod
+except ImportError:
+    if os.environ.get("AUTO_INSTALL_DEPS") == "1":
+        print("RunPod SDK not installed. Installing...")
+        import subprocess
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "runpod"])
+        import runpod
+    else:
+        runpod = None
+
+# Raw bytes encoded per read (multiple of 3 so chunks concatenate without padding)
+ENCODE_CHUNK_SIZE = 3 * 256 * 1024
+# Base64 characters decoded per slice (multiple of 4)
+DECODE_CHUNK_SIZE = 4 * 256 * 1024
+
+def _b64encode_chunked(data) -> str:
+    """Base64-encode a bytes-like object chunk by chunk into one preallocated output buffer"""
+    with memoryview(data) as source:
+        encoded = bytearray(((source.nbytes + 2) // 3) * 4)
+        with memoryview(encoded) as view:
+            offset = 0
+            for start in range(0, source.nbytes, ENCODE_CHUNK_SIZE):
+                chunk = _b64encode(source[start:start + ENCODE_CHUNK_SIZE])
+                view[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+    # The buffer is exactly the encoded size, so it decodes without a trimming copy
+    return encoded.decode('ascii')
+
+# Object storage used to hand input videos to the worker by URL (set S3_ENDPOINT_URL for R2/MinIO)
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
+TEST_S3_BUCKET = os.getenv('TEST_S3_BUCKET') or None
+PRESIGNED_URL_EXPIRY = int(os.getenv('PRESIGNED_URL_EXPIRY', '3600'))
+
+# A test video, either a file path or the raw file contents
+VideoSource = Union[str, bytes]
+
+@dataclass(frozen=True)
+class JobParams:
+    """Inference parameters sent with every test job"""
+    cfg_scale: float = 1.0
+    cfg_rescale: float = 0.0
+    sample_steps: int = 1
+    seed: int = 666
+    res_h: int = 720
+    res_w: int = 1280
+    
+    @classmethod
+    def from_kwargs(cls, **kwargs) -> 'JobParams':
+        """Build parameters from keyword arguments, ignoring any that are not parameters"""
+        return cls(**{name: kwargs[name] for name in _DEFAULTS.keys() & kwargs.keys()})
+    
+    def to_input(self) -> Dict[str, Any]:
+        """Parameters as job input fields"""
+        return {name: getattr(self, name) for name in _DEFAULTS}
+
+# The single source of parameter names and defaults
+_DEFAULTS = MappingProxyType({field.name: field.default for field in fields(JobParams)})
+
+# Longest string field kept when saving test results
+MAX_RESULT_FIELD_SIZE = 64 * 1024
+
+# RunPod REST API, used directly for job submission and status polling
+RUNPOD_ENDPOINT_BASE_URL = os.getenv('RUNPOD_ENDPOINT_BASE_URL', 'https://api.runpod.ai/v2')
+FINAL_JOB_STATES = {'COMPLETED', 'FAILED', 'CANCELLED', 'TIMED_OUT'}
+
+# RunPod handler, imported on first local test
+_HANDLER = None
+
+def _get_handler():
+    """Import the RunPod handler from the working directory once"""
+    global _HANDLER
+    if _HANDLER is None:
+        cwd = str(Path.cwd())
+        if cwd not in sys.path:
+            sys.path.insert(0, cwd)
+        from runpod_handler import handler
+        _HANDLER = handler
+    return _HANDLER
 
 class RunPodWorkerTester:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, s3_bucket: Optional[str] = TEST_S3_BUCKET,
+                 use_base64: bool = False):
         self.api_key = api_key
-        if api_key:
-            runpod.api_key = api_key
+        
+        # Inputs are uploaded and passed as a presigned 'video_url'; base64 'video_data' is the legacy fallback
+        self.s3_bucket = s3_bucket
+        self.use_base64 = use_base64 or not s3_bucket
+        self._s3 = None
+        self._session = None
+        self._session_lock = threading.Lock()
+        
+        # Encoded payloads by (path, mtime, size), so each video is encoded once
+        self._encoded_cache: Dict[tuple, str] = {}
+        self._encoded_cache_lock = threading.Lock()
     
-    def encode_video_file(self, video_path: str) -> str:
+    def encode_video_file(self, video_path: str, st: Optional[os.stat_result] = None) -> str:
         """
-        Encode video file to base64
+        Encode video file to base64, reusing the result while the file is unchanged
+        
+        Pass the file's stat result if the caller already has it, to skip another stat call.
         """
         try:
-            with open(video_path, 'rb') as f:
-                video_bytes = f.read()
-            return base64.b64encode(video_bytes).decode('utf-8')
+            st = st or os.stat(video_path)
+            key = (os.path.abspath(video_path), st.st_mtime_ns, st.st_size)
+            with self._encoded_cache_lock:
+                if key in self._encoded_cache:
+                    return self._encoded_cache[key]
+            
+            # Encode from a memory map, so the file is paged in on demand and
+            # never copied into a Python bytes object
+            video_data = ''
+            if st.st_size:
+                with open(video_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, 'madvise'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    video_data = _b64encode_chunked(mm)
+            with self._encoded_cache_lock:
+                self._encoded_cache[key] = video_data
+            return video_data
         except Exception as e:
             print(f"Failed to encode video file: {e}")
             raise
     
+    @property
+    def s3(self):
+        """S3 client, created on first use"""
+        if self._s3 is None:
+            import boto3
+            self._s3 = boto3.client('s3', endpoint_url=S3_ENDPOINT_URL)
+        return self._s3
+    
+    @property
+    def session(self):
+        """Keep-alive client for the RunPod REST API, created on first use
+        
+        Every submission and status poll reuses its pooled connections instead of paying a
+        new TLS handshake, over HTTP/2 when the h2 package is installed.
+        """
+        # First use can come from submit_many's worker threads, so only one may build it
+        with self._session_lock:
+            if self._session is None:
+                import httpx
+                
+                self._session = httpx.Client(
+                    http2=importlib.util.find_spec('h2') is not None,
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+                    headers={'Authorization': f"Bearer {self.api_key}"},
+                    timeout=30.0
+                )
+            return self._session
+    
+    def _get_job(self, endpoint_id: str, job_id: str) -> Dict[str, Any]:
+        """Fetch a job's status (and output, once finished) from the RunPod REST API"""
+        response = self.session.get(f"{RUNPOD_ENDPOINT_BASE_URL}/{endpoint_id}/status/{job_id}")
+        response.raise_for_status()
+        return orjson.loads(response.content)
+    
+    def encode_video_bytes(self, raw: bytes) -> str:
+        """
+        Encode in-memory video contents to base64
+        """
+        return _b64encode_chunked(raw)
+    
+    def _upload_and_sign(self, video: VideoSource) -> str:
+        """
+        Upload a video to object storage and return a presigned download URL
+        """
+        from boto3.s3.transfer import TransferConfig
+        
+        try:
+            config = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=8)
+            if isinstance(video, bytes):
+                key = f"test-inputs/{uuid.uuid4()}/test_video.mp4"
+                self.s3.upload_fileobj(io.BytesIO(video), self.s3_bucket, key, Config=config)
+            else:
+                key = f"test-inputs/{uuid.uuid4()}/{os.path.basename(video)}"
+                self.s3.upload_file(video, self.s3_bucket, key, Config=config)
+
+            return self.s3.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.s3_bucket, 'Key': key},
+                ExpiresIn=PRESIGNED_URL_EXPIRY
+            )
+        except Exception as e:
+            print(f"Failed to upload video file: {e}")
+            raise
+    
+    def prepare_video_input(self, video: VideoSource, st: Optional[os.stat_result] = None) -> Dict[str, str]:
+        """
+        Build the video part of a job input: a presigned 'video_url', or legacy base64 'video_data'
+        """
+        if not self.use_base64:
+            return {'video_url': self._upload_and_sign(video)}
+        if isinstance(video, bytes):
+            return {'video_data': self.encode_video_bytes(video)}
+        return {'video_data': self.encode_video_file(video, st)}
+    
     def decode_video_result(self, video_data: str, output_path: str) -> None:
         """
         Decode base64 video data and save to file
         """
         try:
-            video_bytes = base64.b64decode(video_data)
-            with open(output_path, 'wb') as f:
-                f.write(video_bytes)
+            # Decode slice by slice and write each one with os.write, skipping the userspace file buffer
+            fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                for start in range(0, len(video_data), DECODE_CHUNK_SIZE):
+                    chunk = video_data[start:start + DECODE_CHUNK_SIZE]
+                    view = memoryview(base64.b64decode(chunk.encode('ascii') if isinstance(chunk, str) else chunk))
+                    while view:
+                        view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
             print(f"Result video saved to: {output_path}")
         except Exception as e:
             print(f"Failed to decode video result: {e}")
             raise
     
-    def test_local_handler(self, video_path: str, **kwargs) -> Dict[str, Any]:
+    def _save_result_video(self, result: Dict[str, Any], output_path: str) -> None:
+        """
+        Save a result's base64 video to disk and drop it from the result, keeping only its size
+        """
+        video_data = result.pop('result_video')
+        result['result_video_size_b64'] = len(video_data)
+        self.decode_video_result(video_data, output_path)
+    
+    def test_local_handler(self, video_path: VideoSource, params: JobParams = JobParams()) -> Dict[str, Any]:
         """
         Test the handler function locally
         """
+        return self._test_local_handler_prepared(self.prepare_video_input(video_path), params)
+    
+    def _test_local_handler_prepared(self, video_input: Dict[str, str],
+                                     params: JobParams = JobParams()) -> Dict[str, Any]:
+        """
+        Test the handler function locally with an already prepared video input
+        """
         print("Testing local handler...")
         
-        # Import the handler
-        sys.path.append(str(Path.cwd()))
-        from runpod_handler import handler
-        
-        # Prepare test input
-        video_data = self.encode_video_file(video_path)
+        handler = _get_handler()
         
         job_input = {
-            'video_data': video_data,
-            'cfg_scale': kwargs.get('cfg_scale', 1.0),
-            'cfg_rescale': kwargs.get('cfg_rescale', 0.0),
-            'sample_steps': kwargs.get('sample_steps', 1),
-            'seed': kwargs.get('seed', 666),
-            'res_h': kwargs.get('res_h', 720),
-            'res_w': kwargs.get('res_w', 1280)
+            **video_input,
+            **params.to_input()
         }
         
         # Create mock job
@@ -88,8 +329,8 @@ class RunPodWorkerTester:
             
             # Save result if successful
             if result.get('status') == 'success' and 'result_video' in result:
-                output_path = f"test_result_local_{kwargs.get('seed', 666)}.mp4"
-                self.decode_video_result(result['result_video'], output_path)
+                output_path = f"test_result_local_{params.seed}.mp4"
+                self._save_result_video(result, output_path)
                 result['local_output_path'] = output_path
             
             return result
@@ -101,41 +342,52 @@ class RunPodWorkerTester:
                 'error_type': type(e).__name__
             }
     
-    def test_remote_endpoint(self, endpoint_id: str, video_path: str, **kwargs) -> Dict[str, Any]:
+    def test_remote_endpoint(self, endpoint_id: str, video_path: VideoSource,
+                             params: JobParams = JobParams()) -> Dict[str, Any]:
         """
         Test the RunPod endpoint remotely
         """
+        if not self.api_key:
+            raise ValueError("API key required for remote testing")
+        
+        return self._test_remote_endpoint_prepared(endpoint_id, self.prepare_video_input(video_path), params)
+    
+    def _test_remote_endpoint_prepared(self, endpoint_id: str, video_input: Dict[str, str],
+                                       params: JobParams = JobParams()) -> Dict[str, Any]:
+        """
+        Test the RunPod endpoint remotely with an already prepared video input
+        """
         print(f"Testing remote endpoint: {endpoint_id}")
         
         if not self.api_key:
             raise ValueError("API key required for remote testing")
         
-        # Prepare test input
-        video_data = self.encode_video_file(video_path)
-        
         job_input = {
-            'video_data': video_data,
-            'cfg_scale': kwargs.get('cfg_scale', 1.0),
-            'cfg_rescale': kwargs.get('cfg_rescale', 0.0),
-            'sample_steps': kwargs.get('sample_steps', 1),
-            'seed': kwargs.get('seed', 666),
-            'res_h': kwargs.get('res_h', 720),
-            'res_w': kwargs.get('res_w', 1280)
+            **video_input,
+            **params.to_input()
         }
         
         try:
             # Run job on RunPod
             print("Submitting job to RunPod...")
-            result = runpod.run_sync(
-                endpoint_id=endpoint_id,
-                job_input=job_input,
-                timeout=600  # 10 minutes
+            response = self.session.post(
+                f"{RUNPOD_ENDPOINT_BASE_URL}/{endpoint_id}/runsync",
+                content=orjson.dumps({'input': job_input}),
+                headers={'Content-Type': 'application/json'},
+                timeout=600.0  # 10 minutes
             )
+            response.raise_for_status()
+            job = orjson.loads(response.content)
+            
+            # /runsync hands back a job still in progress once its own wait expires, keep polling it
+            if job.get('status') not in FINAL_JOB_STATES:
+                job = self.wait_all(endpoint_id, [job['id']], timeout=600)[job['id']]
+            result = job.get('output', job) if job.get('status') == 'COMPLETED' else job
             
             # Save result if successful
             if result.get('status') == 'success' and 'result_video' in result:
-                output_path = f"test_result_remote_{kwargs.get('seed', 666)}.mp4"
-                self.decode_video_result(result['result_video'], output_path)
+                output_path = f"test_result_remote_{params.seed}.mp4"
+                self._save_result_video(result, output_path)
                 result['remote_output_path'] = output_path
             
             return result
@@ -147,7 +399,7 @@ class RunPodWorkerTester:
                 'error_type': type(e).__name__
             }
     
-    def test_async_endpoint(self, endpoint_id: str, video_path: str, **kwargs) -> str:
+    def test_async_endpoint(self, endpoint_id: str, video_path: VideoSource, params: JobParams = JobParams()) -> str:
         """
         Test the RunPod endpoint asynchronously
         """
@@ -157,26 +409,14 @@ class RunPodWorkerTester:
             raise ValueError("API key required for remote testing")
         
         # Prepare test input
-        video_data = self.encode_video_file(video_path)
-        
         job_input = {
-            'video_data': video_data,
-            'cfg_scale': kwargs.get('cfg_scale', 1.0),
-            'cfg_rescale': kwargs.get('cfg_rescale', 0.0),
-            'sample_steps': kwargs.get('sample_steps', 1),
-            'seed': kwargs.get('seed', 666),
-            'res_h': kwargs.get('res_h', 720),
-            'res_w': kwargs.get('res_w', 1280)
+            **self.prepare_video_input(video_path),
+            **params.to_input()
         }
         
         try:
             # Submit async job
-            job = runpod.run(
-                endpoint_id=endpoint_id,
-                job_input=job_input
-            )
-            
-            job_id = job.get('id')
+            job_id = self.submit_many(endpoint_id, [job_input])[0]
             print(f"Job submitted with ID: {job_id}")
             return job_id
             
@@ -184,13 +424,61 @@ class RunPodWorkerTester:
             print(f"Failed to submit async job: {e}")
             raise
     
+    def submit_many(self, endpoint_id: str, job_inputs: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        Submit several async jobs in parallel over one pooled session, returning their IDs in order
+        """
+        if not self.api_key:
+            raise ValueError("API key required for remote testing")
+        
+        def submit(job_input):
+            response = self.session.post(
+                f"{RUNPOD_ENDPOINT_BASE_URL}/{endpoint_id}/run",
+                content=orjson.dumps({'input': job_input}),
+                headers={'Content-Type': 'application/json'}
+            )
+            response.raise_for_status()
+            return orjson.loads(response.content)['id']
+        
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            job_ids = list(executor.map(submit, job_inputs))
+        print(f"Submitted {len(job_ids)} jobs")
+        return job_ids
+    
+    def wait_all(self, endpoint_id: str, job_ids: Iterable[str],
+                 timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Poll jobs until they all finish, backing off exponentially between rounds
+        """
+        pending = set(job_ids)
+        results = {}
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        attempt = 0
+        
+        while pending:
+            for job_id in list(pending):
+                status = self._get_job(endpoint_id, job_id)
+                if status.get('status') in FINAL_JOB_STATES:
+                    results[job_id] = status
+                    pending.discard(job_id)
+            
+            if not pending:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"{len(pending)} jobs still running after {timeout}s")
+            
+            # Capped exponential backoff with jitter keeps status API traffic low on long jobs
+            time.sleep(min(30.0, 0.5 * 2 ** attempt + random.random() * 0.1))
+            attempt += 1
+        
+        return results
+    
     def check_job_status(self, endpoint_id: str, job_id: str) -> Dict[str, Any]:
         """
         Check the status of an async job
         """
         try:
-            status = runpod.status(endpoint_id, job_id)
-            return status
+            return self._get_job(endpoint_id, job_id)
         except Exception as e:
             return {
                 'status': 'error',
@@ -202,12 +490,13 @@ class RunPodWorkerTester:
         Get the result of a completed job
         """
         try:
-            result = runpod.result(endpoint_id, job_id)
+            job = self._get_job(endpoint_id, job_id)
+            result = job.get('output', job) if job.get('status') == 'COMPLETED' else job
             
             # Save result if successful
             if save_result and result.get('status') == 'success' and 'result_video' in result:
                 output_path = f"test_result_async_{job_id}.mp4"
-                self.decode_video_result(result['result_video'], output_path)
+                self._save_result_video(result, output_path)
                 result['async_output_path'] = output_path
             
             return result
@@ -219,57 +508,53 @@ class RunPodWorkerTester:
             }
     
     def run_comprehensive_test(self, 
-                              video_path: str,
+                              video_path: VideoSource,
                               endpoint_id: Optional[str] = None,
                               test_local: bool = True,
                               test_remote: bool = True,
-                              **kwargs) -> Dict[str, Any]:
+                              params: JobParams = JobParams(),
+                              video_stat: Optional[os.stat_result] = None) -> Dict[str, Any]:
         """
         Run comprehensive tests
         """
-        results = {}
-        
         print(f"\n🧪 Running comprehensive tests for SeedVR RunPod Worker")
-        print(f"Input video: {video_path}")
-        print(f"Parameters: {kwargs}")
+        print(f"Input video: {f'<{len(video_path)} bytes in memory>' if isinstance(video_path, bytes) else video_path}")
+        print(f"Parameters: {params.to_input()}")
         
-        # Test local handler
-        if test_local:
-            print("\n--- Local Handler Test ---")
-            try:
-                local_result = self.test_local_handler(video_path, **kwargs)
-                results['local'] = local_result
-                
-                if local_result.get('status') == 'success':
-                    print("✅ Local test passed")
-                else:
-                    print(f"❌ Local test failed: {local_result.get('error')}")
-                    
-            except Exception as e:
-                print(f"❌ Local test error: {e}")
-                results['local'] = {'status': 'error', 'error': str(e)}
+        # Upload or encode once and share the input between the tests
+        video_input = self.prepare_video_input(video_path, video_stat)
         
-        # Test remote endpoint
+        tests = []
+        if test_local:
+            tests.append(('local', lambda: self._test_local_handler_prepared(video_input, params)))
         if test_remote and endpoint_id:
-            print("\n--- Remote Endpoint Test ---")
+            tests.append(('remote', lambda: self._test_remote_endpoint_prepared(endpoint_id, video_input, params)))
+        
+        def run_test(name, test):
             try:
-                remote_result = self.test_remote_endpoint(endpoint_id, video_path, **kwargs)
-                results['remote'] = remote_result
-                
-                if remote_result.get('status') == 'success':
-                    print("✅ Remote test passed")
+                result = test()
+                if result.get('status') == 'success':
+                    print(f"✅ {name.capitalize()} test passed")
                 else:
-                    print(f"❌ Remote test failed: {remote_result.get('error')}")
-                    
+                    print(f"❌ {name.capitalize()} test failed: {result.get('error')}")
+                return result
             except Exception as e:
-                print(f"❌ Remote test error: {e}")
-                results['remote'] = {'status': 'error', 'error': str(e)}
+                print(f"❌ {name.capitalize()} test error: {e}")
+                return {'status': 'error', 'error': str(e)}
+        
+        # The local test is GPU-bound and the remote one waits on the network, so run them side by side
+        with ThreadPoolExecutor(max_workers=max(1, len(tests))) as executor:
+            futures = {executor.submit(run_test, name, test): name for name, test in tests}
+            completed = {futures[future]: future.result() for future in as_completed(futures)}
+        
+        # Report in a stable order regardless of which test finished first
+        results = {name: completed[name] for name, _ in tests}
         
         return results
 
-def create_test_video(output_path: str = "test_video.mp4") -> str:
+def create_test_video(output_path: str = "test_video.mp4", in_memory: bool = False) -> VideoSource:
     """
-    Create a simple test video using ffmpeg
+    Create a simple test video using ffmpeg, returning its path or, with in_memory, its contents
     """
     import subprocess
     
@@ -279,23 +564,42 @@ def create_test_video(output_path: str = "test_video.mp4") -> str:
         '-i', 'testsrc=duration=3:size=640x480:rate=30',
         '-c:v', 'libx264',
         '-pix_fmt', 'yuv420p',
-        output_path
     ]
     
+    if in_memory:
+        # Fragmented MP4 can be written to a pipe since it needs no seek back to the header
+        cmd += ['-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov', 'pipe:1']
+    else:
+        cmd.append(output_path)
+    
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
-        print(f"Test video created: {output_path}")
-        return output_path
+        # Discard ffmpeg's progress log instead of buffering it in Python
+        stdout = subprocess.PIPE if in_memory else subprocess.DEVNULL
+        video = subprocess.run(cmd, check=True, stdout=stdout, stderr=subprocess.DEVNULL).stdout
     except subprocess.CalledProcessError as e:
+        # Rerun once with stderr captured, only to report why it failed
+        rerun = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
         print(f"Failed to create test video: {e}")
+        print(rerun.stderr.decode(errors='replace').strip())
         raise
+    
+    if in_memory:
+        print(f"Test video created in memory: {len(video)} bytes")
+        return video
+    print(f"Test video created: {output_path}")
+    return output_path
 
 def main():
     parser = argparse.ArgumentParser(description="Test SeedVR RunPod Worker")
     parser.add_argument("--video-path", help="Path to test video file")
     parser.add_argument("--endpoint-id", help="RunPod endpoint ID for remote testing")
     parser.add_argument("--api-key", help="RunPod API key")
+    parser.add_argument("--s3-bucket", default=TEST_S3_BUCKET,
+                        help="Bucket for uploading input videos (default: $TEST_S3_BUCKET)")
+    parser.add_argument("--base64", action="store_true", help="Send input videos inline as base64 (legacy)")
     parser.add_argument("--create-test-video", action="store_true", help="Create a test video")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="Keep the created test video in memory instead of on disk")
     parser.add_argument("--test-local", action="store_true", default=True, help="Test local handler")
     parser.add_argument("--test-remote", action="store_true", help="Test remote endpoint")
     parser.add_argument("--cfg-scale", type=float, default=1.0, help="CFG scale")
@@ -306,26 +610,28 @@ def main():
     
     args = parser.parse_args()
     
+    if runpod is None:
+        print("❌ RunPod SDK not installed. Run `pip install runpod` or set AUTO_INSTALL_DEPS=1.")
+        sys.exit(2)
+    
     # Create test video if requested
     if args.create_test_video:
-        args.video_path = create_test_video()
+        args.video_path = create_test_video(in_memory=args.in_memory)
     
-    # Validate video path
-    if not args.video_path or not os.path.exists(args.video_path):
-        print("❌ Valid video path required. Use --create-test-video to generate one.")
-        sys.exit(1)
+    # Validate video path with one stat, reused when encoding (an in-memory test video needs no check)
+    video_stat = None
+    if not isinstance(args.video_path, bytes):
+        try:
+            video_stat = os.stat(args.video_path or '')
+        except OSError:
+            print("❌ Valid video path required. Use --create-test-video to generate one.")
+            sys.exit(1)
     
     # Initialize tester
-    tester = RunPodWorkerTester(args.api_key)
+    tester = RunPodWorkerTester(args.api_key, s3_bucket=args.s3_bucket, use_base64=args.base64)
     
     # Prepare test parameters
-    test_params = {
-        'cfg_scale': args.cfg_scale,
-        'sample_steps': args.sample_steps,
-        'seed': args.seed,
-        'res_h': args.res_h,
-        'res_w': args.res_w
-    }
+    test_params = JobParams.from_kwargs(**vars(args))
     
     try:
         # Run tests
@@ -334,12 +640,18 @@ def main():
             endpoint_id=args.endpoint_id,
             test_local=args.test_local,
             test_remote=args.test_remote,
-            **test_params
+            params=test_params,
+            video_stat=video_stat
         )
         
-        # Save results
-        with open("test_results.json", "w") as f:
-            json.dump(results, f, indent=2)
+        # Save results, without the base64 video (already saved as .mp4) or other huge strings
+        for result in results.values():
+            result.pop('result_video', None)
+            for key, value in result.items():
+                if isinstance(value, str) and len(value) > MAX_RESULT_FIELD_SIZE:
+                    result[key] = f"<omitted len={len(value)}>"
+        with open("test_results.json", "wb") as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
         
         print("\n📊 Test Results Summary:")
         for test_type, result in results.items():
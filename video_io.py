@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+SeedVR Video I/O
+Hardware (NVDEC/NVENC) video decode and encode helpers for the inference workers.
+"""
+
+import os
+import logging
+
+import torch
+from torchvision.io.video import read_video
+
+logger = logging.getLogger(__name__)
+
+# Enable NVDEC decode and NVENC encode of videos
+NVCODEC = os.getenv('NVCODEC', '0') == '1'
+
+# NVDEC decoder for each source codec
+CUVID_DECODERS = {
+    'h264': 'h264_cuvid',
+    'hevc': 'hevc_cuvid',
+    'av1': 'av1_cuvid',
+    'vp9': 'vp9_cuvid',
+    'mpeg4': 'mpeg4_cuvid',
+}
+
+
+def yuv_to_rgb(frames: torch.Tensor) -> torch.Tensor:
+    """Convert decoded TCHW YUV frames to RGB in [0, 1], on the frames' device"""
+    frames = frames.to(torch.float32) / 255.0
+    y = frames[:, 0]
+    u = frames[:, 1] - 0.5
+    v = frames[:, 2] - 0.5
+    r = y + 1.14 * v
+    g = y - 0.396 * u - 0.581 * v
+    b = y + 2.029 * u
+    return torch.stack([r, g, b], dim=1).clamp_(0.0, 1.0)
+
+
+class GpuVideoReader:
+    """Video reader that decodes with NVDEC so frames land in VRAM without a host copy"""
+
+    def __init__(self, device: str = 'cuda:0', frames_per_chunk: int = 16):
+        self.device = device
+        self.frames_per_chunk = frames_per_chunk
+
+    def __call__(self, path: str) -> torch.Tensor:
+        """Read a video as TCHW frames in [0, 1], falling back to CPU decode"""
+        try:
+            return self._read_nvdec(path)
+        except Exception as e:
+            logger.warning(f"NVDEC decode failed for {path} ({str(e)}), falling back to CPU decode")
+            return read_video(path, output_format="TCHW")[0] / 255.0
+
+    def _read_nvdec(self, path: str) -> torch.Tensor:
+        from torchaudio.io import StreamReader
+
+        reader = StreamReader(path)
+        codec = reader.get_src_stream_info(reader.default_video_stream).codec
+        decoder = CUVID_DECODERS.get(codec)
+        if decoder is None:
+            raise ValueError(f"no NVDEC decoder for codec {codec!r}")
+
+        reader.add_video_stream(self.frames_per_chunk, decoder=decoder, hw_accel=self.device)
+        return torch.cat([yuv_to_rgb(chunk) for (chunk,) in reader.stream()])
+
+
+def get_video_io():
+    """Get the (video_reader, video_codec) pair to pass to generation_loop"""
+    if NVCODEC and torch.cuda.is_available():
+        return GpuVideoReader(), 'h264_nvenc'
+    return None, 'h264'